@@ -2,59 +2,178 @@
 
 """System metrics logger for tracking temperature, RAM, and uptime history."""
 
+import atexit
+import bisect
 import json
 import os
-from datetime import datetime
+import queue
+import threading
+import time
+from collections import deque
+from itertools import islice
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Dict
+from typing import Deque, List, Dict, Optional
+
+try:
+    import orjson
+except ImportError:  # optional, stdlib json is used otherwise
+    orjson = None
+
+
+def _dumps(obj) -> bytes:
+    """Encode obj as compact JSON bytes, using orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf8")
+
+
+# Fields recorded per entry; history is kept as one column per field
+_FIELDS = ("timestamp", "cpu_temp_c", "ram_used_percent", "ram_used_mb")
 
 
 # System metrics logger
 class SystemLogger:
-    def __init__(self, log_dir: str = "logs", max_entries: int = 1000):
+    def __init__(self, log_dir: str = "logs", max_entries: int = 1000,
+                 flush_interval: float = 1.0, trim_every: int = 100):
         """Initialize logger with configurable directory and max entries."""
         self.log_dir = Path(log_dir)
         self.log_dir.mkdir(exist_ok=True)
         self.max_entries = max_entries
-        self.log_file = self.log_dir / f"metrics_{datetime.now().strftime('%Y%m%d')}.json"
-    
+        self.trim_every = trim_every
+        self._appends = 0
+        self._set_log_file()
+        # Recent entries live in memory; a background thread batches them to disk
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._cols = self._load_columns()
+        self.flush_interval = flush_interval
+        # Bounded so a stalled writer can't grow memory without limit
+        self._q: "queue.Queue[Dict]" = queue.Queue(maxsize=max_entries)
+        threading.Thread(target=self._writer_loop, name="metrics-log-writer", daemon=True).start()
+        atexit.register(self._flush)
+
     def log_metrics(self, metrics: Dict) -> None:
-        """Append metrics to daily log file."""
-        entries = self._load_entries()
-        entries.append({
-            "timestamp": metrics.get("timestamp"),
-            "datetime": datetime.now().isoformat(),
+        """Record metrics in memory and queue them for the daily log file."""
+        ram = metrics.get("ram", {})
+        entry = {
+            "timestamp": metrics.get("timestamp") or 0,
             "cpu_temp_c": metrics.get("cpu_temp_c"),
-            "ram_used_percent": metrics.get("ram", {}).get("used_percent"),
-            "ram_used_mb": metrics.get("ram", {}).get("used_mb")
-        })
-        
-        # Keep only recent entries
-        if len(entries) > self.max_entries:
-            entries = entries[-self.max_entries:]
-        
-        self._save_entries(entries)
-    
-    def get_history(self, hours: int = 1) -> List[Dict]:
-        """Get metrics history for the last N hours."""
-        entries = self._load_entries()
+            "ram_used_percent": ram.get("used_percent"),
+            "ram_used_mb": ram.get("used_mb"),
+        }
+        with self._lock:
+            # Entries are append-ordered, so the timestamp column stays sorted
+            for k in _FIELDS:
+                self._cols[k].append(entry[k])
+        # Disk I/O happens on the writer thread, off the request path
+        try:
+            self._q.put_nowait(entry)
+        except queue.Full:
+            # Writer is behind; the entry is still kept in memory for history
+            pass
+
+    def _set_log_file(self, ts: Optional[float] = None) -> None:
+        """Point log_file at the file for ts's day (default today) and remember when it ends."""
+        now = datetime.now() if ts is None else datetime.fromtimestamp(ts)
+        # Newline-delimited JSON: one entry per line, so logging is a plain append.
+        # Kept as a plain str, which open() takes without an __fspath__ call.
+        self.log_file = str(self.log_dir / f"metrics_{now:%Y%m%d}.jsonl")
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        self._day_end = midnight.timestamp()
+
+    def get_history(self, hours: int = 1) -> Dict[str, List]:
+        """Get metrics history for the last N hours as {field: [values...]} columns."""
         cutoff = datetime.now().timestamp() - (hours * 3600)
-        return [e for e in entries if e.get("timestamp", 0) >= cutoff]
-    
-    def _load_entries(self) -> List[Dict]:
-        """Load existing entries from log file."""
-        if not self.log_file.exists():
-            return []
+        with self._lock:
+            ts = self._cols["timestamp"]
+            n = len(ts) - bisect.bisect_left(ts, cutoff)
+            # Copy the n newest values from the right end; islice from idx would walk the head
+            return {k: list(islice(reversed(v), n))[::-1] for k, v in self._cols.items()}
+
+    def _load_columns(self) -> Dict[str, Deque]:
+        """Load the most recent entries (at most max_entries) from log file into columns."""
+        # Bounded deques: appends past max_entries drop the oldest value in O(1)
+        cols = {k: deque(maxlen=self.max_entries) for k in _FIELDS}
+        if not os.path.exists(self.log_file):
+            return cols
         try:
-            with open(self.log_file, "r") as f:
-                return json.load(f)
+            with open(self.log_file, "rb") as f:
+                # Only the tail matters; deque discards older lines as it reads
+                for line in deque(f, maxlen=self.max_entries):
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Skip a partially written line
+                        continue
+                    cols["timestamp"].append(entry.get("timestamp") or 0)
+                    for k in _FIELDS[1:]:
+                        cols[k].append(entry.get(k))
         except Exception:
-            return []
-    
-    def _save_entries(self, entries: List[Dict]) -> None:
-        """Save entries to log file."""
+            for col in cols.values():
+                col.clear()
+        return cols
+
+    def _writer_loop(self) -> None:
+        """Background thread: write queued entries to disk every flush_interval seconds."""
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self._flush()
+            except Exception as e:
+                # Keep the thread alive; the next interval retries with whatever is queued
+                print(f"Error flushing log: {e}")
+
+    def _flush(self) -> None:
+        """Append all queued entries to the log file."""
+        with self._io_lock:
+            pending = []
+            try:
+                while True:
+                    pending.append(self._q.get_nowait())
+            except queue.Empty:
+                pass
+            # Split the batch at midnight so each entry lands in the file for its own day
+            start = 0
+            for i, entry in enumerate(pending):
+                if entry["timestamp"] >= self._day_end:
+                    self._write_batch(pending[start:i])
+                    self._set_log_file(entry["timestamp"])
+                    self._appends = 0
+                    start = i
+            self._write_batch(pending[start:])
+
+    def _write_batch(self, entries: List[Dict]) -> None:
+        """Append entries to the current log file and trim it if due."""
+        if not entries:
+            return
+        self._append_entries(entries)
+        self._maybe_trim(len(entries))
+
+    def _append_entries(self, entries: List[Dict]) -> None:
+        """Append entries to the log file in a single write."""
         try:
-            with open(self.log_file, "w") as f:
-                json.dump(entries, f, indent=2)
+            with open(self.log_file, "ab") as f:
+                f.write(b"".join(_dumps(e) + b"\n" for e in entries))
         except Exception as e:
             print(f"Error saving log: {e}")
+
+    def _maybe_trim(self, appended: int) -> None:
+        """Every trim_every appends, cut the log file back to max_entries lines."""
+        self._appends += appended
+        if self._appends < self.trim_every:
+            return
+        self._appends = 0
+        try:
+            with open(self.log_file, "rb") as f:
+                lines = deque(f, maxlen=self.max_entries + 1)
+            if len(lines) <= self.max_entries:
+                return
+            lines.popleft()
+            tmp_file = self.log_file + ".tmp"
+            # One buffer, one write call
+            with open(tmp_file, "wb") as f:
+                f.write(b"".join(lines))
+            os.replace(tmp_file, self.log_file)
+        except Exception as e:
+            print(f"Error trimming log: {e}")
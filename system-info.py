@@ -1,30 +1,87 @@
 # Author: Omi Shrestha
 from __future__ import annotations
 
+import fcntl
+import hashlib
 import json
 import os
+import re
+import shutil
+import struct
 import subprocess
+import threading
 import time
-from datetime import timedelta
 from typing import Dict, Optional
 
-from flask import Flask, jsonify, render_template_string, request
+from flask import Flask, request
 
-from logger import SystemLogger
+# _dumps: compact JSON bytes, orjson-encoded when it is installed
+from logger import SystemLogger, _dumps
 
 app = Flask(__name__)
 logger = SystemLogger()
 
+# Only the fields get_ram_usage needs, matched in a single pass over /proc/meminfo
+_MEMINFO_RE = re.compile(rb"^(MemTotal|MemAvailable|MemFree):\s+(\d+)", re.M)
+# MemTotal doesn't change while we run, so after the first read only these are parsed
+_MEMAVAIL_RE = re.compile(rb"^(MemAvailable|MemFree):\s+(\d+)", re.M)
+_MEM_TOTAL_KB: Optional[int] = None
+
+_SYS_TEMP_PATH = "/sys/class/thermal/thermal_zone0/temp"
+# Availability of each temperature source, checked once on first use
+_SYS_TEMP_PATH_EXISTS: Optional[bool] = None
+_VCGENCMD_AVAILABLE: Optional[bool] = None
+# /dev/vcio descriptor: None until first use, -1 if the mailbox can't be opened
+_VCIO_FD: Optional[int] = None
+
+# VideoCore mailbox property interface (what vcgencmd uses under the hood)
+_VCIO_PATH = "/dev/vcio"
+_IOCTL_MBOX_PROPERTY = (3 << 30) | (struct.calcsize("P") << 16) | (100 << 8)  # _IOWR(100, 0, char *)
+_MBOX_TAG_GET_TEMPERATURE = 0x00030006
+_MBOX_RESPONSE_OK = 0x80000000
+
+# Last collected status as encoded JSON, shared by all clients polling within _STATUS_TTL seconds
+_STATUS_TTL = 1.0
+_STATUS_CACHE: Dict[str, object] = {"t": 0.0, "body": None, "etag": None}
+_STATUS_LOCK = threading.Lock()
+
+# Open file descriptors for the /proc and /sys files polled on every request
+_PROC_FDS: Dict[str, int] = {}
+_PROC_FDS_LOCK = threading.Lock()
+
+
+def _read_proc_file(path: str, size: int = 8192) -> bytes:
+		"""Read a small /proc or /sys file through a descriptor kept open between calls.
+
+		pread from offset 0 re-generates the file contents without another open().
+		Reads are serialized so a descriptor is never opened twice or closed while
+		another thread is still reading from it.
+		"""
+		with _PROC_FDS_LOCK:
+				fd = _PROC_FDS.get(path)
+				if fd is None:
+						fd = _PROC_FDS[path] = os.open(path, os.O_RDONLY)
+				try:
+						return os.pread(fd, size, 0)
+				except OSError:
+						# e.g. the device went away; reopen on the next call
+						del _PROC_FDS[path]
+						os.close(fd)
+						raise
+
 
 def _read_sys_temp() -> Optional[float]:
 		"""Try reading the CPU temperature from the sysfs path used on Linux/Raspberry Pi.
 
 		Returns temperature in Celsius, or None if not available.
 		"""
-		path = "/sys/class/thermal/thermal_zone0/temp"
+		global _SYS_TEMP_PATH_EXISTS
+		if _SYS_TEMP_PATH_EXISTS is None:
+				_SYS_TEMP_PATH_EXISTS = os.path.exists(_SYS_TEMP_PATH)
+		if not _SYS_TEMP_PATH_EXISTS:
+				return None
 		try:
-				with open(path, "r", encoding="utf8") as f:
-						raw = f.read().strip()
+				raw = _read_proc_file(_SYS_TEMP_PATH).strip()
 				# file usually contains millidegrees Celsius
 				temp_milli = int(raw)
 				return temp_milli / 1000.0
@@ -32,11 +89,48 @@ def _read_sys_temp() -> Optional[float]:
 				return None
 
 
+def _read_vcio_temp() -> Optional[float]:
+		"""Fallback: ask the VideoCore firmware for the SoC temperature via /dev/vcio.
+
+		Same source as `vcgencmd measure_temp`, but in-process with a single ioctl.
+		Returns temperature in Celsius, or None if the mailbox is unavailable.
+		"""
+		global _VCIO_FD
+		if _VCIO_FD is None:
+				try:
+						_VCIO_FD = os.open(_VCIO_PATH, os.O_RDWR)
+				except OSError:
+						_VCIO_FD = -1
+		if _VCIO_FD < 0:
+				return None
+		# size, request code, tag, value buffer size, tag request code, temperature id, value, end tag
+		buf = bytearray(struct.pack("<8I", 32, 0, _MBOX_TAG_GET_TEMPERATURE, 8, 0, 0, 0, 0))
+		try:
+				fcntl.ioctl(_VCIO_FD, _IOCTL_MBOX_PROPERTY, buf, True)
+		except OSError:
+				return None
+		words = struct.unpack("<8I", buf)
+		if words[1] != _MBOX_RESPONSE_OK:
+				return None
+		# The tag must be answered too (bit 31 + value length), for the id we asked about;
+		# otherwise words[6] is still the 0 we packed, not a reading
+		tag_resp = words[4]
+		if not tag_resp & _MBOX_RESPONSE_OK or (tag_resp & ~_MBOX_RESPONSE_OK) < 8 or words[5] != 0:
+				return None
+		# value is in millidegrees Celsius
+		return words[6] / 1000.0
+
+
 def _read_vcgencmd_temp() -> Optional[float]:
-		"""Fallback: call `vcgencmd measure_temp` if available (older Pi toolchain).
+		"""Last resort: call `vcgencmd measure_temp` if available (older Pi toolchain).
 
 		Returns temperature in Celsius, or None on failure.
 		"""
+		global _VCGENCMD_AVAILABLE
+		if _VCGENCMD_AVAILABLE is None:
+				_VCGENCMD_AVAILABLE = shutil.which("vcgencmd") is not None
+		if not _VCGENCMD_AVAILABLE:
+				return None
 		try:
 				out = subprocess.check_output(["vcgencmd", "measure_temp"], stderr=subprocess.DEVNULL)
 				out_str = out.decode("utf8").strip()
@@ -51,6 +145,9 @@ def _read_vcgencmd_temp() -> Optional[float]:
 def get_cpu_temp_c() -> Optional[float]:
 		"""Return CPU temperature in Celsius if available, otherwise None."""
 		t = _read_sys_temp()
+		if t is not None:
+				return t
+		t = _read_vcio_temp()
 		if t is not None:
 				return t
 		return _read_vcgencmd_temp()
@@ -61,18 +158,19 @@ def get_ram_usage() -> Dict[str, float]:
 
 		Uses /proc/meminfo for portability on Linux.
 		"""
-		meminfo = {}
+		global _MEM_TOTAL_KB
 		try:
-				with open("/proc/meminfo", "r", encoding="utf8") as f:
-						for line in f:
-								parts = line.split(":")
-								if len(parts) != 2:
-										continue
-								key = parts[0].strip()
-								val = parts[1].strip().split()[0]
-								meminfo[key] = int(val)  # kB
-				total_kb = meminfo.get("MemTotal", 0)
-				available_kb = meminfo.get("MemAvailable", meminfo.get("MemFree", 0))
+				data = _read_proc_file("/proc/meminfo")
+				# values are in kB
+				if _MEM_TOTAL_KB is None:
+						meminfo = dict(_MEMINFO_RE.findall(data))
+						total_kb = int(meminfo.get(b"MemTotal", 0))
+						if total_kb:
+								_MEM_TOTAL_KB = total_kb
+				else:
+						meminfo = dict(_MEMAVAIL_RE.findall(data))
+						total_kb = _MEM_TOTAL_KB
+				available_kb = int(meminfo.get(b"MemAvailable", meminfo.get(b"MemFree", 0)))
 				used_kb = max(total_kb - available_kb, 0)
 				total_mb = total_kb / 1024.0
 				available_mb = available_kb / 1024.0
@@ -94,16 +192,14 @@ def get_uptime() -> Dict[str, str]:
 		Reads /proc/uptime for Linux.
 		"""
 		try:
-				with open("/proc/uptime", "r", encoding="utf8") as f:
-						raw = f.read().strip()
-				secs = float(raw.split()[0])
-				td = timedelta(seconds=int(secs))
+				raw = _read_proc_file("/proc/uptime").strip()
+				secs = int(float(raw.split()[0]))
 				# Format as X days, HH:MM:SS
-				days = td.days
-				hours, remainder = divmod(td.seconds, 3600)
+				days, remainder = divmod(secs, 86400)
+				hours, remainder = divmod(remainder, 3600)
 				minutes, seconds = divmod(remainder, 60)
 				human = f"{days}d {hours:02d}:{minutes:02d}:{seconds:02d}"
-				return {"seconds": str(int(secs)), "human": human}
+				return {"seconds": str(secs), "human": human}
 		except Exception:
 				return {"seconds": "0", "human": "0d 00:00:00"}
 
@@ -114,7 +210,7 @@ def collect_status() -> Dict[str, object]:
 		ram = get_ram_usage()
 		up = get_uptime()
 		return {
-				"cpu_temp_c": (round(temp, 2) if isinstance(temp, (int, float)) else None),
+				"cpu_temp_c": None if temp is None else round(temp, 2),
 				"ram": ram,
 				"uptime": up,
 				"timestamp": int(time.time()),
@@ -170,23 +266,57 @@ HTML_TEMPLATE = """
 """
 
 
+def ojsonify(obj):
+		"""Like flask.jsonify, but encoded with orjson when it is installed."""
+		return app.response_class(_dumps(obj), mimetype="application/json")
+
+
+# The page has no template variables, so serve it as-is instead of rendering through Jinja
+_INDEX_BODY = HTML_TEMPLATE.encode("utf8")
+_INDEX_HEADERS = {"Cache-Control": "public, max-age=3600"}
+
+
 @app.route("/")
 def index():
-		return render_template_string(HTML_TEMPLATE)
+		return app.response_class(_INDEX_BODY, mimetype="text/html", headers=_INDEX_HEADERS)
 
 
 @app.route("/api/status")
 def api_status():
-	status = collect_status()
-	logger.log_metrics(status)
-	return jsonify(status)
+	with _STATUS_LOCK:
+		now = time.monotonic()
+		if _STATUS_CACHE["body"] is None or now - _STATUS_CACHE["t"] >= _STATUS_TTL:
+			status = collect_status()
+			# log once per collection, not once per client
+			logger.log_metrics(status)
+			body = _dumps(status)
+			_STATUS_CACHE["body"] = body
+			_STATUS_CACHE["etag"] = hashlib.md5(body, usedforsecurity=False).hexdigest()
+			_STATUS_CACHE["t"] = now
+		body = _STATUS_CACHE["body"]
+		etag = _STATUS_CACHE["etag"]
+	resp = app.response_class(body, mimetype="application/json", headers={"Cache-Control": "no-cache"})
+	resp.set_etag(etag)
+	# answers 304 Not Modified when If-None-Match still matches
+	return resp.make_conditional(request)
 
 
 @app.route("/api/history")
 def api_history():
-	hours = int(request.args.get("hours", 1))
-	return jsonify(logger.get_history(hours))
+	# Bad input falls back to the default instead of a 500; cap at one week
+	try:
+		hours = max(1, min(168, int(request.args.get("hours", 1))))
+	except (TypeError, ValueError):
+		hours = 1
+	return ojsonify(logger.get_history(hours))
 if __name__ == "__main__":
 		# Default to listening on all interfaces so you can open from other devices on the LAN.
 		# Debug disabled by default; pass FLASK_DEBUG=1 in env to enable if desired.
-		app.run(host=os.environ.get("HOST", "0.0.0.0"), port=int(os.environ.get("PORT", "5000")), debug=(os.environ.get("FLASK_DEBUG")=="1"))
+		host = os.environ.get("HOST", "0.0.0.0")
+		port = int(os.environ.get("PORT", "5000"))
+		if os.environ.get("FLASK_DEBUG") == "1":
+				app.run(host=host, port=port, debug=True)
+		else:
+				# Threaded production server so slow requests don't block other clients
+				from waitress import serve
+				serve(app, host=host, port=port, threads=int(os.environ.get("THREADS", "4")))